@@ -5,8 +5,10 @@ from firebase_admin import credentials, firestore, storage
 import pandas as pd
 import gspread
 from gspread_dataframe import set_with_dataframe
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.oauth2.service_account import Credentials
-from datetime import datetime
+from datetime import datetime, timedelta
 import io
 import uuid
 
@@ -20,6 +22,19 @@ try:
     firebase_creds_dict = dict(st.secrets["FIREBASE_KEY"])
     gspread_creds_dict = dict(st.secrets["GSPREAD_KEY"])
 
+except (KeyError, FileNotFoundError):
+    st.error(
+        "필수 인증 정보(FIREBASE_KEY 또는 GSPREAD_KEY)를 찾을 수 없습니다. Streamlit Secrets를 확인하세요.")
+    st.stop()
+
+
+# Gspread 클라이언트 생성 함수
+@st.cache_resource
+def get_gspread_client():
+    """
+    Google 스프레드시트 클라이언트를 생성합니다.
+    데이터 백업에서만 사용하므로 필요할 때 한 번만 인증하고 이후에는 재사용합니다.
+    """
     # Gspread 인증 범위 설정
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
@@ -28,19 +43,15 @@ try:
     gspread_credentials = Credentials.from_service_account_info(
         gspread_creds_dict, scopes=scopes
     )
-    gc = gspread.authorize(gspread_credentials)
-
-except (KeyError, FileNotFoundError):
-    st.error(
-        "필수 인증 정보(FIREBASE_KEY 또는 GSPREAD_KEY)를 찾을 수 없습니다. Streamlit Secrets를 확인하세요.")
-    st.stop()
+    return gspread.authorize(gspread_credentials)
 
 
 # Firebase 앱 초기화 함수
+@st.cache_resource
 def initialize_firebase():
     """
-    Firebase 앱이 초기화되지 않았을 경우 초기화합니다.
-    st.secrets에서 인증 정보를 가져와 사용합니다.
+    Firebase 앱이 초기화되지 않았을 경우 초기화하고 Firestore 클라이언트를 반환합니다.
+    st.secrets에서 인증 정보를 가져와 사용하며, 재실행마다 클라이언트를 새로 만들지 않도록 프로세스당 한 번만 생성합니다.
     """
     try:
         if not firebase_admin._apps:
@@ -58,27 +69,65 @@ def initialize_firebase():
 db = initialize_firebase()
 
 
+# Storage 버킷 조회 함수
+@st.cache_resource
+def get_bucket():
+    """
+    수업계획서 PDF를 저장하는 Storage 버킷을 반환합니다.
+    버킷 설정에 문제가 있어도 PDF 기능만 실패하도록 처음 사용할 때 조회합니다.
+    """
+    return storage.bucket()
+
+
+# 수업계획서 PDF 최대 업로드 크기 (10MB)
+UPLOAD_LIMIT = 10 << 20
+
+# 학생 목록 한 페이지에 표시할 인원
+STUDENT_PAGE_SIZE = 50
+
+# 수업 요일 목록
+WEEKDAYS = ["월", "화", "수", "목", "금"]
+
+# 출결 상태 목록 및 상태별 선택 위치
+ATTENDANCE_STATES = ["출석", "결석", "지각", "공결"]
+_STATE_IX = {state: i for i, state in enumerate(ATTENDANCE_STATES)}
+
+
 # --- 2. 헬퍼 함수 (데이터베이스 및 스토리지 CRUD) ---
 
 # PDF 파일 업로드
 def upload_pdf_to_storage(file_object, destination_blob_name):
-    """Firebase Storage에 PDF 파일을 업로드하고 공개 URL과 파일 경로를 반환합니다."""
+    """
+    Firebase Storage에 PDF 파일을 업로드하고 파일 경로를 반환합니다.
+    열람용 URL은 저장하지 않고 get_pdf_url()로 필요할 때 서명해 사용합니다.
+    """
     try:
-        bucket = storage.bucket()
-        blob = bucket.blob(destination_blob_name)
+        blob = get_bucket().blob(destination_blob_name)
+        # 256KB 단위로 나누어 전송 (재개 가능한 업로드)
+        blob.chunk_size = 256 * 1024
 
-        # 파일 포인터를 처음으로 되돌림
-        file_object.seek(0)
+        # 업로드된 파일은 이미 메모리에 있으므로 복사 없이 처음부터 그대로 전송
+        blob.upload_from_file(file_object, content_type='application/pdf',
+                              size=file_object.size, rewind=True)
 
-        blob.upload_from_file(file_object, content_type='application/pdf')
-
-        # 파일에 공개 접근 권한 부여
-        blob.make_public()
-
-        return blob.public_url, destination_blob_name
+        return destination_blob_name
     except Exception as e:
         st.error(f"파일 업로드 실패: {e}")
-        return None, None
+        return None
+
+
+# PDF 파일 열람 URL
+@st.cache_data(ttl=3300, show_spinner=False)
+def get_pdf_url(blob_name):
+    """
+    Storage의 PDF 파일에 대한 서명된 URL(1시간 유효)을 생성합니다.
+    만료 전까지는 캐시된 URL을 재사용해 화면을 그릴 때마다 서명하지 않습니다.
+    서명 오류는 캐시되지 않도록 호출한 쪽으로 그대로 전달합니다.
+    """
+    blob = get_bucket().blob(blob_name)
+    return blob.generate_signed_url(version="v4",
+                                    expiration=timedelta(hours=1),
+                                    method="GET")
 
 
 # PDF 파일 삭제
@@ -87,14 +136,256 @@ def delete_pdf_from_storage(blob_name):
     if not blob_name:
         return
     try:
-        bucket = storage.bucket()
-        blob = bucket.blob(blob_name)
+        blob = get_bucket().blob(blob_name)
         if blob.exists():
             blob.delete()
     except Exception as e:
         st.warning(f"Storage 파일 삭제 중 오류 발생: {e}")
 
 
+# 재시도 설정된 BulkWriter 생성
+def create_bulk_writer(failed_writes, max_attempts=3):
+    """
+    일시적 오류는 max_attempts회까지 재시도하는 BulkWriter를 만듭니다.
+    끝내 실패한 쓰기는 failed_writes 리스트에 모아 호출한 쪽에서 알릴 수 있게 합니다.
+    """
+    def handle_write_error(error, _):
+        if error.attempts < max_attempts:
+            return True
+        failed_writes.append(error)
+        return False
+
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_error(handle_write_error)
+    return bulk_writer
+
+
+# 교과 정보를 수업 문서에 반영
+def sync_course_to_classes(course_id, name, year, semester):
+    """
+    수업 문서에 복사해 둔 교과명/학년도/학기를 변경된 교과 정보로 갱신합니다.
+    끝내 갱신하지 못한 쓰기 목록을 반환합니다.
+    """
+    failed_writes = []
+    bulk_writer = create_bulk_writer(failed_writes)
+    for doc in db.collection("classes").where(
+            filter=FieldFilter("course_id", "==", course_id)).select(
+            []).stream():
+        bulk_writer.update(doc.reference, {"course_name": name, "year": year,
+                                           "semester": semester})
+    bulk_writer.close()
+    load_classes.clear()
+    return failed_writes
+
+
+# 수업 삭제
+def delete_class(class_id):
+    """
+    수업 문서와 함께 소속 학생, 진도 기록, 출결 기록을 모두 삭제합니다.
+    하위 기록 중 삭제하지 못한 것이 있으면 수업 문서는 남겨 두고 실패 목록을 반환합니다.
+    """
+    class_ref = db.collection("classes").document(class_id)
+    # BulkWriter가 삭제 요청을 병렬로 묶어 전송하고 일시적 오류는 재시도함
+    failed_writes = []
+    bulk_writer = create_bulk_writer(failed_writes)
+    for sub_collection in ["students", "progress"]:
+        for doc in class_ref.collection(sub_collection).select([]).stream():
+            bulk_writer.delete(doc.reference)
+    for doc in db.collection("attendance").where(
+            filter=FieldFilter("class_id", "==", class_id)).select(
+            []).stream():
+        bulk_writer.delete(doc.reference)
+    bulk_writer.close()
+    if not failed_writes:
+        class_ref.delete()
+    load_classes.clear()
+    clear_student_cache()
+    return failed_writes
+
+
+# 수업 삭제 시 함께 삭제될 기록 수
+def count_class_records(class_id):
+    """수업에 딸린 학생, 진도 기록, 출결 기록 수를 집계 쿼리로 세어 반환합니다."""
+    class_ref = db.collection("classes").document(class_id)
+    queries = {
+        "학생": class_ref.collection("students"),
+        "진도 기록": class_ref.collection("progress"),
+        "출결 기록": db.collection("attendance").where(
+            filter=FieldFilter("class_id", "==", class_id)),
+    }
+    return {label: query.count().get()[0][0].value
+            for label, query in queries.items()}
+
+
+# 날짜별 진도 기록 조회
+def get_progress_list(class_id, date_str):
+    """
+    해당 수업 반의 날짜별 진도 기록을 조회합니다.
+    위젯 조작으로 재실행될 때마다 다시 조회하지 않도록 결과를 세션에 저장해 둡니다.
+    """
+    key = f"progress_{class_id}_{date_str}"
+    rows = st.session_state.get(key)
+    if rows is None:
+        progress_ref = db.collection("classes").document(
+            class_id).collection("progress").where(
+            filter=FieldFilter("date", "==", date_str)).select(
+            ["period", "topic", "notes"]).order_by("period").stream()
+        rows = [{"id": doc.id, **doc.to_dict()} for doc in progress_ref]
+        st.session_state[key] = rows
+    return rows
+
+
+# 교과 목록 조회
+@st.cache_data(ttl=300, show_spinner=False)
+def load_courses():
+    """
+    교과 목록을 최신 학년도/학기 순으로 조회합니다.
+    재실행마다 다시 조회하지 않도록 캐시하며, 교과가 변경되면 load_courses.clear()로 비웁니다.
+    """
+    courses_ref = db.collection("courses").select(
+        ["name", "year", "semester", "pdf_path", "pdf_url"]).order_by(
+        "year", direction=firestore.Query.DESCENDING).order_by(
+        "semester", direction=firestore.Query.DESCENDING).stream()
+    return [{"id": doc.id, **doc.to_dict()} for doc in courses_ref]
+
+
+# 수업 목록 조회
+@st.cache_data(ttl=300, show_spinner=False)
+def load_classes():
+    """수업 목록을 최신 학년도/학기 순으로 조회합니다. 수업이 변경되면 load_classes.clear()로 비웁니다."""
+    classes_ref = db.collection("classes").select(
+        ["class_name", "course_id", "course_name", "year", "semester",
+         "schedule"]).order_by(
+        "year", direction=firestore.Query.DESCENDING).order_by(
+        "semester", direction=firestore.Query.DESCENDING).stream()
+    return [{"id": doc.id, **doc.to_dict()} for doc in classes_ref]
+
+
+# 교과 기본 정보 조회
+@st.cache_data(ttl=300, show_spinner=False)
+def _course_snapshot(course_id):
+    """수업 문서에 함께 저장할 교과 정보 (교과명, 학년도, 학기)를 반환합니다."""
+    doc = db.collection("courses").document(course_id).get(
+        field_paths=["name", "year", "semester"])
+    c = doc.to_dict() if doc.exists else {}
+    return c.get("name"), c.get("year"), c.get("semester")
+
+
+# 수업 반 선택 목록
+@st.cache_data(max_entries=8, show_spinner=False)
+def _class_labels(classes_key):
+    """(수업 ID, 학급명, 교과명) 튜플로부터 선택 상자 표시 이름을 만듭니다."""
+    return {class_id: f"{class_name} ({course_name})"
+            for class_id, class_name, course_name in classes_key}
+
+
+def get_class_options():
+    """수업 반 선택 상자에 사용할 {수업 ID: 표시 이름} 딕셔너리를 반환합니다."""
+    classes_key = tuple((c["id"], c.get('class_name', '이름 없음'),
+                         c.get('course_name', '')) for c in load_classes())
+    return _class_labels(classes_key)
+
+
+# 학생 명단 조회
+@st.cache_data(ttl=30, show_spinner=False)
+def load_students(class_id):
+    """
+    해당 수업 반의 학생 목록을 학번 순으로 조회합니다.
+    재실행마다 문서를 다시 받아 변환하지 않도록 캐시하며, 학생 정보가 변경되면 clear_student_cache()로 비웁니다.
+    """
+    students_ref = db.collection("classes").document(class_id).collection(
+        "students").select(["student_number", "name"]).order_by(
+        "student_number").stream()
+    return [{"id": doc.id, **doc.to_dict()} for doc in students_ref]
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_students_page(class_id, start_after=None):
+    """
+    학번 순으로 start_after (학번, 문서 ID) 다음부터 한 페이지 분량의 학생을 조회합니다.
+    학번이 중복될 수 있으므로 문서 ID를 보조 정렬 기준으로 함께 사용합니다.
+    다음 페이지가 있는지 알 수 있도록 STUDENT_PAGE_SIZE보다 한 명 더 조회합니다.
+    """
+    students_collection = db.collection("classes").document(
+        class_id).collection("students")
+    query = students_collection.select(["student_number", "name"]).order_by(
+        "student_number").order_by(FieldPath.document_id())
+    if start_after is not None:
+        student_number, student_id = start_after
+        query = query.start_after({
+            "student_number": student_number,
+            FieldPath.document_id(): students_collection.document(student_id)
+        })
+    students_ref = query.limit(STUDENT_PAGE_SIZE + 1).stream()
+    return [{"id": doc.id, **doc.to_dict()} for doc in students_ref]
+
+
+def clear_student_cache():
+    """학생 정보가 변경되었을 때 학생 목록 캐시를 비웁니다."""
+    load_students.clear()
+    load_students_page.clear()
+
+
+# 날짜별 출결 기록 조회
+@st.cache_data(ttl=30, show_spinner=False)
+def load_attendance_map(class_id, date_str):
+    """
+    해당 수업 반의 날짜별 출결 기록을 학생 ID 기준으로 조회합니다.
+    (class_id, date) 복합 인덱스를 사용하며, 출결을 저장하면 load_attendance_map.clear()로 비웁니다.
+    """
+    attendance_ref = db.collection("attendance").where(
+        filter=FieldFilter("class_id", "==", class_id)).where(
+        filter=FieldFilter("date", "==", date_str)).select(
+        ["student_id", "status", "notes"]).stream()
+    attendance_data = {}
+    for doc in attendance_ref:
+        a = doc.to_dict()
+        attendance_data[a.get('student_id')] = a
+    return attendance_data
+
+
+# 학생 명단 CSV 파싱
+@st.cache_data(show_spinner=False)
+def parse_student_csv(file_bytes):
+    """업로드된 CSV 내용을 DataFrame으로 변환합니다. 같은 파일은 다시 파싱하지 않습니다."""
+    return pd.read_csv(io.BytesIO(file_bytes), dtype=str)
+
+
+# 진도/출결 조회 캐시 무효화
+def invalidate_daily_records(class_id, date_str):
+    """진도/출결 기록이 변경되었을 때 저장해 둔 조회 결과를 삭제합니다."""
+    st.session_state.pop(f"progress_{class_id}_{date_str}", None)
+    load_attendance_map.clear()
+
+
+# 수업 시간표 문자열
+def format_schedule(class_id, schedule):
+    """
+    수업 시간표를 '월1, 화3' 형태의 문자열로 변환합니다.
+    재실행 시 반복 계산을 피하기 위해 (수업 ID, 시간표) 기준으로 세션에 저장해 둡니다.
+    """
+    key = (class_id,
+           tuple((item.get('day'), item.get('period')) for item in schedule))
+    cache = st.session_state.setdefault("_sched_cache", {})
+    schedule_str = cache.get(key)
+    if schedule_str is None:
+        schedule_str = ", ".join(f"{day}{period}" for day, period in key[1])
+        cache[key] = schedule_str
+    return schedule_str
+
+
+# 선택 가능한 목록 표
+def render_selectable_table(df, key, column_config=None):
+    """한 행을 선택할 수 있는 표를 그리고, 선택된 행의 위치(없으면 None)를 반환합니다."""
+    event = st.dataframe(df, use_container_width=True, hide_index=True,
+                         column_config=column_config, on_select="rerun",
+                         selection_mode="single-row", key=key)
+    selected_rows = event.selection.rows
+    if selected_rows and selected_rows[0] < len(df):
+        return selected_rows[0]
+    return None
+
+
 # --- 3. 메뉴별 기능 구현 ---
 
 # 3.1. 교과 관리
@@ -107,10 +398,15 @@ def course_dialog(course_id=None):
 
     default_data = {}
     if is_edit:
-        doc_ref = db.collection("courses").document(course_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            default_data = doc.to_dict()
+        # 캐시된 교과 목록에 있으면 재사용하고, 없을 때만 문서를 조회
+        cached = next((c for c in load_courses() if c["id"] == course_id),
+                      None)
+        if cached is not None:
+            default_data = cached
+        else:
+            doc = db.collection("courses").document(course_id).get()
+            if doc.exists:
+                default_data = doc.to_dict()
 
     with st.form("course_form"):
         year = st.number_input("학년도", min_value=2020, max_value=2050,
@@ -129,26 +425,52 @@ def course_dialog(course_id=None):
                 data = {"year": year, "semester": semester, "name": name}
 
                 if uploaded_file is not None:
-                    if uploaded_file.size > 10 * 1024 * 1024:
+                    if uploaded_file.size > UPLOAD_LIMIT:
                         st.error("파일 크기가 10MB를 초과할 수 없습니다.")
                         return
 
+                    # 확장자/MIME 대신 파일 앞 4바이트로 PDF 여부 확인
+                    header = uploaded_file.read(4)
+                    uploaded_file.seek(0)
+                    if header != b"%PDF":
+                        st.error("올바른 PDF 파일이 아닙니다.")
+                        return
+
                     if is_edit and default_data.get("pdf_path"):
                         delete_pdf_from_storage(default_data["pdf_path"])
 
                     file_path = f"plans/{uuid.uuid4()}_{uploaded_file.name}"
-                    pdf_url, pdf_path = upload_pdf_to_storage(uploaded_file,
-                                                              file_path)
-                    if pdf_url:
-                        data["pdf_url"] = pdf_url
+                    pdf_path = upload_pdf_to_storage(uploaded_file, file_path)
+                    if pdf_path:
                         data["pdf_path"] = pdf_path
+                        if is_edit and default_data.get("pdf_url"):
+                            # 이전 방식으로 저장된 공개 URL 제거
+                            data["pdf_url"] = firestore.DELETE_FIELD
 
                 if is_edit:
                     db.collection("courses").document(course_id).update(data)
+                    _course_snapshot.clear()
+                    load_courses.clear()
+                    # 이전 저장에서 수업 반영에 실패했다면 값이 같아도 다시 반영
+                    pending_key = f"course_sync_pending_{course_id}"
+                    if st.session_state.pop(pending_key, False) or (
+                            name, year, semester) != (
+                            default_data.get("name"),
+                            default_data.get("year"),
+                            default_data.get("semester")):
+                        failed_writes = sync_course_to_classes(
+                            course_id, name, year, semester)
+                        if failed_writes:
+                            st.session_state[pending_key] = True
+                            st.warning(
+                                f"교과 정보는 수정되었으나 {len(failed_writes)}개 수업에 "
+                                f"변경 내용을 반영하지 못했습니다. 다시 저장해주세요.")
+                            return
                     st.success("교과 정보가 수정되었습니다.")
                 else:
                     data["created_at"] = firestore.SERVER_TIMESTAMP
                     db.collection("courses").add(data)
+                    load_courses.clear()
                     st.success("새 교과가 추가되었습니다.")
 
                 st.rerun()
@@ -162,53 +484,74 @@ def course_management():
         course_dialog()
 
     st.subheader("등록된 교과 목록")
-    courses_ref = db.collection("courses").order_by("year",
-                                                    direction=firestore.Query.DESCENDING).order_by(
-        "semester", direction=firestore.Query.DESCENDING).stream()
-    courses_list = list(courses_ref)
+    courses_list = load_courses()
 
     if not courses_list:
         st.info("등록된 교과가 없습니다. '새 교과 추가' 버튼을 눌러 추가해주세요.")
     else:
-        for course in courses_list:
-            c = course.to_dict()
-            with st.container(border=True):
-                col1, col2, col3, col4, col5 = st.columns([3, 3, 1, 1, 1])
-                with col1:
-                    st.markdown(f"**{c.get('name', '이름 없음')}**")
-                with col2:
-                    st.markdown(f"_{c.get('year')}년 {c.get('semester')}학기_")
-                with col3:
-                    if c.get("pdf_url"):
-                        st.link_button("계획서 보기", c["pdf_url"],
-                                       use_container_width=True)
-                with col4:
-                    if st.button("수정", key=f"edit_{course.id}",
-                                 use_container_width=True):
-                        course_dialog(course_id=course.id)
-                with col5:
-                    if st.button("삭제", key=f"delete_{course.id}",
-                                 type="secondary", use_container_width=True):
-                        if c.get("pdf_path"):
-                            delete_pdf_from_storage(c["pdf_path"])
-                        db.collection("courses").document(course.id).delete()
-                        st.success(f"'{c.get('name')}' 교과가 삭제되었습니다.")
-                        st.rerun()
+        columns = {"교과명": [], "학년도": [], "학기": [], "계획서": []}
+        for c in courses_list:
+            columns["교과명"].append(c.get("name", "이름 없음"))
+            columns["학년도"].append(c.get("year"))
+            columns["학기"].append(c.get("semester"))
+            pdf_url = c.get("pdf_url")
+            if c.get("pdf_path"):
+                try:
+                    pdf_url = get_pdf_url(c["pdf_path"])
+                except Exception:
+                    pdf_url = None
+            columns["계획서"].append(pdf_url)
+        # 학년도·학기는 작은 정수형(결측 허용)으로 둔다
+        columns["학년도"] = pd.array(columns["학년도"], dtype="Int16")
+        columns["학기"] = pd.array(columns["학기"], dtype="Int8")
+        selected = render_selectable_table(
+            pd.DataFrame(columns), key="course_table",
+            column_config={"계획서": st.column_config.LinkColumn(
+                "계획서", display_text="열기")})
+
+        if selected is None:
+            st.caption("수정하거나 삭제할 교과를 목록에서 선택하세요.")
+        else:
+            c = courses_list[selected]
+            col1, col2, _ = st.columns([1, 1, 6])
+            with col1:
+                if st.button("수정", key=f"edit_{c['id']}",
+                             use_container_width=True):
+                    course_dialog(course_id=c['id'])
+            with col2:
+                if st.button("삭제", key=f"delete_{c['id']}",
+                             type="secondary", use_container_width=True):
+                    if c.get("pdf_path"):
+                        delete_pdf_from_storage(c["pdf_path"])
+                    db.collection("courses").document(c['id']).delete()
+                    _course_snapshot.clear()
+                    load_courses.clear()
+                    st.success(f"'{c.get('name')}' 교과가 삭제되었습니다.")
+                    st.rerun()
 
 
 # 3.2. 수업 관리
 @st.dialog("수업 정보")
-def class_dialog(courses, class_id=None):
-    """수업 추가 또는 수정을 위한 다이얼로그 함수"""
+def class_dialog(courses, class_id=None, course_snapshots=None):
+    """
+    수업 추가 또는 수정을 위한 다이얼로그 함수
+    course_snapshots에 {교과 ID: (교과명, 학년도, 학기)}를 넘기면 저장 시 교과 문서를 다시 조회하지 않습니다.
+    """
     is_edit = class_id is not None
     title = "수업 수정" if is_edit else "새 수업 추가"
     st.subheader(title)
 
     default_data = {}
     if is_edit:
-        doc = db.collection("classes").document(class_id).get()
-        if doc.exists:
-            default_data = doc.to_dict()
+        # 캐시된 수업 목록에 있으면 재사용하고, 없을 때만 문서를 조회
+        cached = next((c for c in load_classes() if c["id"] == class_id),
+                      None)
+        if cached is not None:
+            default_data = cached
+        else:
+            doc = db.collection("classes").document(class_id).get()
+            if doc.exists:
+                default_data = doc.to_dict()
 
     with st.form("class_form"):
         course_ids = list(courses.keys())
@@ -223,11 +566,10 @@ def class_dialog(courses, class_id=None):
         class_name = st.text_input("학급명 (예: 1학년 1반)",
                                    value=default_data.get("class_name", ""))
 
-        days = ["월", "화", "수", "목", "금"]
         default_schedule = default_data.get("schedule", [])
 
         schedule_data = []
-        for day in days:
+        for day in WEEKDAYS:
             periods_for_day = [item['period'] for item in default_schedule if
                                item.get('day') == day]
             selected_periods = st.multiselect(f"{day}요일 수업 교시",
@@ -241,15 +583,16 @@ def class_dialog(courses, class_id=None):
             if not class_name:
                 st.warning("학급명을 입력해주세요.")
             else:
-                course_doc_snap = db.collection("courses").document(
-                    selected_course_id).get()
-                course_doc = course_doc_snap.to_dict() if course_doc_snap.exists else {}
+                snapshot = (course_snapshots or {}).get(selected_course_id)
+                if snapshot is None:
+                    snapshot = _course_snapshot(selected_course_id)
+                _, course_year, course_semester = snapshot
 
                 data = {
                     "course_id": selected_course_id,
                     "course_name": courses.get(selected_course_id, "이름 없음"),
-                    "year": course_doc.get("year"),
-                    "semester": course_doc.get("semester"),
+                    "year": course_year,
+                    "semester": course_semester,
                     "class_name": class_name,
                     "schedule": schedule_data
                 }
@@ -261,52 +604,86 @@ def class_dialog(courses, class_id=None):
                     db.collection("classes").add(data)
                     st.success("새 수업이 추가되었습니다.")
 
+                load_classes.clear()
+
                 st.rerun()
 
 
+@st.dialog("수업 삭제")
+def delete_class_dialog(class_id, class_name):
+    """삭제될 기록 수를 보여 주고 확인을 받은 뒤 수업을 삭제하는 다이얼로그 함수"""
+    counts = count_class_records(class_id)
+    st.warning(f"'{class_name}' 수업과 함께 아래 기록이 모두 삭제되며 되돌릴 수 없습니다.")
+    st.markdown("\n".join(f"- {label}: {count}건"
+                          for label, count in counts.items()))
+
+    col1, col2 = st.columns(2)
+    if col1.button("삭제", type="primary", use_container_width=True):
+        with st.spinner("수업 정보를 삭제 중입니다..."):
+            failed_writes = delete_class(class_id)
+        if failed_writes:
+            st.error(
+                f"{len(failed_writes)}건의 학생/진도/출결 기록을 삭제하지 못해 "
+                f"수업은 삭제되지 않았습니다. 다시 시도해주세요.")
+        else:
+            st.success(f"'{class_name}' 수업이 삭제되었습니다.")
+            st.rerun()
+    if col2.button("취소", use_container_width=True):
+        st.rerun()
+
+
 def class_management():
     st.header("🏫 수업 관리")
     st.markdown("담당 교과에 대한 학급을 등록하고 관리합니다.")
 
-    courses_ref = db.collection("courses").stream()
-    courses = {doc.id: doc.to_dict().get('name', f'이름 없는 교과 (ID:{doc.id})') for
-               doc in courses_ref}
+    courses_list = load_courses()
+    courses = {c["id"]: c.get('name', f'이름 없는 교과 (ID:{c["id"]})') for
+               c in courses_list}
+    course_snapshots = {c["id"]: (c.get("name"), c.get("year"),
+                                  c.get("semester")) for c in courses_list}
 
     if not courses:
         st.warning("먼저 '교과 관리' 메뉴에서 교과를 추가해주세요.")
         return
 
     if st.button("➕ 새 수업 추가", type="primary"):
-        class_dialog(courses)
+        class_dialog(courses, course_snapshots=course_snapshots)
 
     st.subheader("등록된 수업 목록")
-    classes_ref = db.collection("classes").order_by("year",
-                                                    direction=firestore.Query.DESCENDING).order_by(
-        "semester", direction=firestore.Query.DESCENDING).stream()
-    classes_list = list(classes_ref)
+    classes_list = load_classes()
 
     if not classes_list:
         st.info("등록된 수업이 없습니다.")
     else:
-        for class_doc in classes_list:
-            c = class_doc.to_dict()
-            with st.container(border=True):
-                col1, col2, col3, col4 = st.columns([3, 4, 1, 1])
-                with col1:
-                    st.markdown(f"**{c.get('class_name', '이름 없음')}**")
-                with col2:
-                    st.markdown(
-                        f"_{c.get('year')}년 {c.get('semester')}학기 / {c.get('course_name', '')}_")
-                with col3:
-                    if st.button("수정", key=f"edit_class_{class_doc.id}",
-                                 use_container_width=True):
-                        class_dialog(courses, class_id=class_doc.id)
-                with col4:
-                    if st.button("삭제", key=f"delete_class_{class_doc.id}",
-                                 type="secondary", use_container_width=True):
-                        db.collection("classes").document(class_doc.id).delete()
-                        st.success(f"'{c.get('class_name')}' 수업이 삭제되었습니다.")
-                        st.rerun()
+        columns = {"학급명": [], "학년도": [], "학기": [], "교과": [], "시간표": []}
+        for c in classes_list:
+            columns["학급명"].append(c.get("class_name", "이름 없음"))
+            columns["학년도"].append(c.get("year"))
+            columns["학기"].append(c.get("semester"))
+            columns["교과"].append(c.get("course_name", ""))
+            columns["시간표"].append(
+                format_schedule(c["id"], c.get("schedule", [])))
+        # 학년도·학기는 작은 정수형, 반복되는 교과명은 범주형으로 둔다
+        columns["학년도"] = pd.array(columns["학년도"], dtype="Int16")
+        columns["학기"] = pd.array(columns["학기"], dtype="Int8")
+        columns["교과"] = pd.Categorical(columns["교과"])
+        selected = render_selectable_table(pd.DataFrame(columns),
+                                           key="class_table")
+
+        if selected is None:
+            st.caption("수정하거나 삭제할 수업을 목록에서 선택하세요.")
+        else:
+            c = classes_list[selected]
+            col1, col2, _ = st.columns([1, 1, 6])
+            with col1:
+                if st.button("수정", key=f"edit_class_{c['id']}",
+                             use_container_width=True):
+                    class_dialog(courses, class_id=c['id'],
+                                 course_snapshots=course_snapshots)
+            with col2:
+                if st.button("삭제", key=f"delete_class_{c['id']}",
+                             type="secondary", use_container_width=True):
+                    delete_class_dialog(c['id'], c.get('class_name'))
 
 
 # 3.3. 학생 관리
@@ -345,6 +722,8 @@ def student_dialog(class_id, student_id=None):
                     student_collection.add(data)
                     st.success("학생이 추가되었습니다.")
 
+                clear_student_cache()
+
                 st.rerun()
 
 
@@ -352,10 +731,7 @@ def student_management():
     st.header("🧑‍🎓 학생 관리")
     st.markdown("수업 반별로 학생 정보를 추가, 수정, 삭제합니다.")
 
-    classes_ref = db.collection("classes").stream()
-    classes_dict = {
-        doc.id: f"{doc.to_dict().get('class_name', '이름 없음')} ({doc.to_dict().get('course_name', '')})"
-        for doc in classes_ref}
+    classes_dict = get_class_options()
 
     if not classes_dict:
         st.warning("먼저 '수업 관리' 메뉴에서 수업을 추가해주세요.")
@@ -369,30 +745,58 @@ def student_management():
     if selected_class_id:
         st.subheader(f"'{classes_dict.get(selected_class_id)}' 학생 목록")
 
-        students_ref = db.collection("classes").document(
-            selected_class_id).collection("students").order_by(
-            "student_number").stream()
-        students_list = list(students_ref)
+        # 페이지마다 시작 위치(직전 페이지 마지막 학생의 학번, ID)를 쌓아 두고 이전/다음 이동에 사용
+        cursors = st.session_state.setdefault(
+            f"student_cursors_{selected_class_id}", [None])
+        page = load_students_page(selected_class_id, cursors[-1])
+        has_next = len(page) > STUDENT_PAGE_SIZE
+        students_list = page[:STUDENT_PAGE_SIZE]
+
+        if not students_list and len(cursors) > 1:
+            # 삭제 등으로 현재 페이지가 비었으면 이전 페이지로 이동
+            cursors.pop()
+            st.rerun()
 
         if not students_list:
             st.info("등록된 학생이 없습니다.")
         else:
-            for student in students_list:
-                s = student.to_dict()
-                with st.container(border=True):
-                    col1, col2, col3, col4 = st.columns([2, 3, 1, 1])
-                    col1.text(s.get("student_number", "학번 없음"))
-                    col2.text(s.get("name", "이름 없음"))
-                    if col3.button("수정", key=f"edit_student_{student.id}",
-                                   use_container_width=True):
-                        student_dialog(selected_class_id, student_id=student.id)
-                    if col4.button("삭제", key=f"delete_student_{student.id}",
-                                   type="secondary", use_container_width=True):
-                        db.collection("classes").document(
-                            selected_class_id).collection("students").document(
-                            student.id).delete()
-                        st.success("학생 정보가 삭제되었습니다.")
-                        st.rerun()
+            selected = render_selectable_table(
+                pd.DataFrame({
+                    "학번": [s.get("student_number", "학번 없음") for s in
+                           students_list],
+                    "이름": [s.get("name", "이름 없음") for s in students_list],
+                }),
+                key=f"student_table_{selected_class_id}_{len(cursors)}")
+
+            p_col1, p_col2, p_col3, _ = st.columns([1, 1, 1, 5])
+            if p_col1.button("◀ 이전 페이지", disabled=len(cursors) == 1,
+                             use_container_width=True):
+                cursors.pop()
+                st.rerun()
+            p_col2.markdown(f"{len(cursors)} 페이지")
+            if p_col3.button("다음 페이지 ▶", disabled=not has_next,
+                             use_container_width=True):
+                last_student = students_list[-1]
+                cursors.append((last_student.get("student_number"),
+                                last_student["id"]))
+                st.rerun()
+
+            if selected is None:
+                st.caption("수정하거나 삭제할 학생을 목록에서 선택하세요.")
+            else:
+                student_id = students_list[selected]["id"]
+                col1, col2, _ = st.columns([1, 1, 6])
+                if col1.button("수정", key=f"edit_student_{student_id}",
+                               use_container_width=True):
+                    student_dialog(selected_class_id, student_id=student_id)
+                if col2.button("삭제", key=f"delete_student_{student_id}",
+                               type="secondary", use_container_width=True):
+                    db.collection("classes").document(
+                        selected_class_id).collection("students").document(
+                        student_id).delete()
+                    clear_student_cache()
+                    st.success("학생 정보가 삭제되었습니다.")
+                    st.rerun()
 
         st.divider()
         col1, col2 = st.columns(2)
@@ -402,27 +806,47 @@ def student_management():
 
         with col2:
             csv_file = st.file_uploader("📄 엑셀(CSV)로 일괄 등록", type="csv")
-            if csv_file is not None:
+            # 이 수업 반에 이미 등록한 파일은 재실행 시 다시 처리하지 않음
+            if csv_file is not None and st.session_state.get(
+                    "imported_csv_id") != (selected_class_id,
+                                           csv_file.file_id):
                 try:
-                    df = pd.read_csv(csv_file)
+                    df = parse_student_csv(csv_file.getvalue())
                     if '학번' not in df.columns or '이름' not in df.columns:
                         st.error("CSV 파일에 '학번'과 '이름' 컬럼이 필요합니다.")
                     else:
                         with st.spinner("학생 정보를 등록 중입니다..."):
-                            batch = db.batch()
                             student_collection = db.collection(
                                 "classes").document(
                                 selected_class_id).collection("students")
-                            for _, row in df.iterrows():
-                                doc_ref = student_collection.document()
-                                batch.set(doc_ref, {
-                                    "student_number": str(row['학번']),
-                                    "name": str(row['이름']),
+                            # 행 단위 반복 대신 열 단위로 문자열 정리 후 빈 행 제외
+                            numbers = df['학번'].fillna("").str.strip()
+                            names = df['이름'].fillna("").str.strip()
+                            mask = (numbers != "") & (names != "")
+
+                            # BulkWriter로 병렬 전송 (일시 오류는 자동 재시도)
+                            failed_writes = []
+                            bulk_writer = create_bulk_writer(failed_writes)
+                            total_count = 0
+                            for number, student_name in zip(numbers[mask],
+                                                            names[mask]):
+                                bulk_writer.create(student_collection.document(), {
+                                    "student_number": number,
+                                    "name": student_name,
                                     "created_at": firestore.SERVER_TIMESTAMP
                                 })
-                            batch.commit()
-                        st.success(f"{len(df)}명의 학생 정보가 성공적으로 등록되었습니다.")
-                        st.rerun()
+                                total_count += 1
+                            bulk_writer.close()
+                        clear_student_cache()
+                        st.session_state["imported_csv_id"] = (
+                            selected_class_id, csv_file.file_id)
+                        if failed_writes:
+                            st.error(
+                                f"{total_count - len(failed_writes)}명은 등록되었으나 "
+                                f"{len(failed_writes)}명의 학생 정보를 저장하지 못했습니다.")
+                        else:
+                            st.success(f"{total_count}명의 학생 정보가 성공적으로 등록되었습니다.")
+                            st.rerun()
                 except Exception as e:
                     st.error(f"CSV 파일 처리 중 오류 발생: {e}")
 
@@ -464,6 +888,7 @@ def progress_dialog(class_id, date_str, progress_id=None):
                     progress_collection.add(data)
                     st.success("진도가 추가되었습니다.")
 
+                invalidate_daily_records(class_id, date_str)
                 st.rerun()
 
 
@@ -471,10 +896,7 @@ def progress_management():
     st.header("📈 진도 관리")
     st.markdown("수업 반별로 일자, 교시, 진도와 특기사항을 관리합니다.")
 
-    classes_ref = db.collection("classes").stream()
-    classes_dict = {
-        doc.id: f"{doc.to_dict().get('class_name', '이름 없음')} ({doc.to_dict().get('course_name', '')})"
-        for doc in classes_ref}
+    classes_dict = get_class_options()
 
     if not classes_dict:
         st.warning("먼저 '수업 관리' 메뉴에서 수업을 추가해주세요.")
@@ -492,39 +914,45 @@ def progress_management():
     date_str = selected_date.strftime("%Y-%m-%d")
 
     if selected_class_id:
-        if st.button("➕ 진도 추가", type="primary"):
+        b_col1, b_col2, _ = st.columns([1, 1, 6])
+        if b_col1.button("➕ 진도 추가", type="primary"):
             progress_dialog(class_id=selected_class_id, date_str=date_str)
+        if b_col2.button("🔄 새로고침", key="refresh_progress"):
+            invalidate_daily_records(selected_class_id, date_str)
 
         st.subheader(f"'{date_str}'의 진도 기록")
-        progress_ref = db.collection("classes").document(
-            selected_class_id).collection("progress").where("date", "==",
-                                                            date_str).order_by(
-            "period").stream()
-        progress_list = list(progress_ref)
+        progress_list = get_progress_list(selected_class_id, date_str)
 
         if not progress_list:
             st.info("해당 날짜에 등록된 진도 기록이 없습니다.")
         else:
-            for progress in progress_list:
-                p = progress.to_dict()
-                with st.container(border=True):
-                    st.markdown(f"**{p.get('period')}교시: {p.get('topic')}**")
-                    if p.get('notes'):
-                        st.text(f"특기사항: {p.get('notes')}")
-
-                    b_col1, b_col2, _ = st.columns([1, 1, 8])
-                    if b_col1.button("수정", key=f"edit_progress_{progress.id}",
-                                     use_container_width=True):
-                        progress_dialog(selected_class_id, date_str,
-                                        progress_id=progress.id)
-                    if b_col2.button("삭제", key=f"delete_progress_{progress.id}",
-                                     type="secondary",
-                                     use_container_width=True):
-                        db.collection("classes").document(
-                            selected_class_id).collection("progress").document(
-                            progress.id).delete()
-                        st.success("진도 기록이 삭제되었습니다.")
-                        st.rerun()
+            # 행 단위 딕셔너리 대신 열 단위 리스트로 표를 구성
+            columns = {"교시": [], "학습 내용": [], "특기사항": []}
+            for p in progress_list:
+                columns["교시"].append(p.get("period"))
+                columns["학습 내용"].append(p.get("topic"))
+                columns["특기사항"].append(p.get("notes", ""))
+            selected = render_selectable_table(
+                pd.DataFrame(columns),
+                key=f"progress_table_{selected_class_id}_{date_str}")
+
+            if selected is None:
+                st.caption("수정하거나 삭제할 진도 기록을 목록에서 선택하세요.")
+            else:
+                progress_id = progress_list[selected]["id"]
+                b_col1, b_col2, _ = st.columns([1, 1, 6])
+                if b_col1.button("수정", key=f"edit_progress_{progress_id}",
+                                 use_container_width=True):
+                    progress_dialog(selected_class_id, date_str,
+                                    progress_id=progress_id)
+                if b_col2.button("삭제", key=f"delete_progress_{progress_id}",
+                                 type="secondary", use_container_width=True):
+                    db.collection("classes").document(
+                        selected_class_id).collection("progress").document(
+                        progress_id).delete()
+                    invalidate_daily_records(selected_class_id, date_str)
+                    st.success("진도 기록이 삭제되었습니다.")
+                    st.rerun()
 
 
 # 3.5. 출결 관리
@@ -532,10 +960,7 @@ def attendance_management():
     st.header("📋 출결 관리")
     st.markdown("학생별 출결 상태 및 특기사항을 관리합니다.")
 
-    classes_ref = db.collection("classes").stream()
-    classes_dict = {
-        doc.id: f"{doc.to_dict().get('class_name', '이름 없음')} ({doc.to_dict().get('course_name', '')})"
-        for doc in classes_ref}
+    classes_dict = get_class_options()
 
     if not classes_dict:
         st.warning("먼저 '수업 관리' 메뉴에서 수업을 추가해주세요.")
@@ -553,101 +978,120 @@ def attendance_management():
     date_str = selected_date.strftime("%Y-%m-%d")
 
     if selected_class_id:
-        students_ref = db.collection("classes").document(
-            selected_class_id).collection("students").order_by(
-            "student_number").stream()
-        students_list = list(students_ref)
+        # 두 조회 모두 캐시되므로 재실행 시에는 Firestore를 다시 조회하지 않음
+        # (st.cache_data 함수는 스크립트 스레드에서만 호출)
+        students_list = load_students(selected_class_id)
+        attendance_data = load_attendance_map(selected_class_id, date_str)
 
         if not students_list:
             st.info("이 반에 등록된 학생이 없습니다. '학생 관리' 메뉴에서 추가해주세요.")
             return
 
-        attendance_ref = db.collection("attendance").where("class_id", "==",
-                                                           selected_class_id).where(
-            "date", "==", date_str).stream()
-        attendance_data = {doc.to_dict().get('student_id'): doc.to_dict() for
-                           doc in attendance_ref}
+        # 입력 위젯 상태는 수업/날짜별 키로 세션에 두고, 저장 시 세션에서 바로 읽음
+        key_prefix = f"att_{selected_class_id}_{date_str}_"
 
         st.subheader(f"'{date_str}' 출결 현황")
+        if st.button("🔄 새로고침", key="refresh_attendance"):
+            invalidate_daily_records(selected_class_id, date_str)
+            for key in [k for k in st.session_state if
+                        k.startswith(key_prefix)]:
+                del st.session_state[key]
+            st.rerun()
 
         with st.form("attendance_form"):
-            attendance_inputs = {}
-
             header_cols = st.columns([2, 3, 3, 5])
             header_cols[0].markdown("**학번**")
             header_cols[1].markdown("**이름**")
             header_cols[2].markdown("**출결 상태**")
             header_cols[3].markdown("**특기사항**")
 
-            for student in students_list:
-                s_id = student.id
-                s_data = student.to_dict()
+            for s_data in students_list:
+                s_id = s_data["id"]
 
                 existing_att = attendance_data.get(s_id, {})
+                existing_status = existing_att.get("status")
+                st.session_state.setdefault(
+                    f"{key_prefix}status_{s_id}",
+                    existing_status if existing_status in _STATE_IX else
+                    ATTENDANCE_STATES[0])
+                st.session_state.setdefault(f"{key_prefix}notes_{s_id}",
+                                            existing_att.get("notes", ""))
 
                 cols = st.columns([2, 3, 3, 5])
                 cols[0].text(s_data.get("student_number"))
                 cols[1].text(s_data.get("name"))
 
-                status = cols[2].selectbox(
+                cols[2].selectbox(
                     "출결 상태",
-                    ["출석", "결석", "지각", "공결"],
-                    index=["출석", "결석", "지각", "공결"].index(
-                        existing_att.get("status", "출석")),
-                    key=f"status_{s_id}",
+                    ATTENDANCE_STATES,
+                    key=f"{key_prefix}status_{s_id}",
                     label_visibility="collapsed"
                 )
-                notes = cols[3].text_input(
+                cols[3].text_input(
                     "특기사항",
-                    value=existing_att.get("notes", ""),
-                    key=f"notes_{s_id}",
+                    key=f"{key_prefix}notes_{s_id}",
                     label_visibility="collapsed"
                 )
 
-                attendance_inputs[s_id] = {
-                    "student_data": s_data,
-                    "status": status,
-                    "notes": notes
-                }
-
             submitted = st.form_submit_button("💾 일괄 저장",
                                               use_container_width=True,
                                               type="primary")
             if submitted:
-                with st.spinner("출결 정보를 저장 중입니다..."):
-                    batch = db.batch()
-                    attendance_collection = db.collection("attendance")
-
-                    for s_id, inputs in attendance_inputs.items():
-                        query = attendance_collection.where("class_id", "==",
-                                                            selected_class_id).where(
-                            "date", "==", date_str).where("student_id", "==",
-                                                          s_id).limit(
-                            1).stream()
-                        existing_docs = list(query)
-
-                        data = {
-                            "class_id": selected_class_id,
-                            "student_id": s_id,
-                            "student_number": inputs["student_data"].get(
-                                "student_number"),
-                            "student_name": inputs["student_data"].get("name"),
-                            "date": date_str,
-                            "status": inputs["status"],
-                            "notes": inputs["notes"],
-                            "last_updated_at": firestore.SERVER_TIMESTAMP
-                        }
-
-                        if existing_docs:
-                            doc_ref = existing_docs[0].reference
-                            batch.update(doc_ref, data)
-                        else:
-                            doc_ref = attendance_collection.document()
-                            batch.set(doc_ref, data)
+                failed_writes = []
+                try:
+                    with st.spinner("출결 정보를 저장 중입니다..."):
+                        # BulkWriter가 쓰기를 병렬로 전송하고 충돌/일시 오류는 최대 3회까지 재시도
+                        bulk_writer = create_bulk_writer(failed_writes)
+                        attendance_collection = db.collection("attendance")
+
+                        # 기존 출결 문서를 한 번의 쿼리로 조회해 학생 ID별로 정리
+                        existing_query = attendance_collection.where(
+                            filter=FieldFilter("class_id", "==",
+                                               selected_class_id)).where(
+                            filter=FieldFilter("date", "==", date_str)).select(
+                            ["student_id"]).stream()
+                        existing_refs = {doc.to_dict().get("student_id"):
+                                             doc.reference for doc in
+                                         existing_query}
+
+                        for s_data in students_list:
+                            s_id = s_data["id"]
+                            data = {
+                                "class_id": selected_class_id,
+                                "student_id": s_id,
+                                # 학생이 삭제된 뒤에도 백업에서 알아볼 수 있도록 함께 저장
+                                "student_number": s_data.get(
+                                    "student_number"),
+                                "student_name": s_data.get("name"),
+                                "date": date_str,
+                                "status": st.session_state[
+                                    f"{key_prefix}status_{s_id}"],
+                                "notes": st.session_state[
+                                    f"{key_prefix}notes_{s_id}"],
+                                "last_updated_at": firestore.SERVER_TIMESTAMP
+                            }
+
+                            doc_ref = existing_refs.get(s_id)
+                            if doc_ref is not None:
+                                bulk_writer.update(doc_ref, data)
+                            else:
+                                # 생성 시각은 서버에서 기록하므로 별도 조회가 필요 없음
+                                data["created_at"] = firestore.SERVER_TIMESTAMP
+                                doc_ref = attendance_collection.document()
+                                bulk_writer.create(doc_ref, data)
+
+                        bulk_writer.close()
+                except Exception as e:
+                    st.error(f"출결 정보 저장 중 오류 발생: {e}")
+                    return
+                finally:
+                    invalidate_daily_records(selected_class_id, date_str)
 
-                    batch.commit()
-                st.success("출결 정보가 성공적으로 저장되었습니다.")
-                st.rerun()
+                if failed_writes:
+                    st.error(f"{len(failed_writes)}명의 출결 정보를 저장하지 못했습니다. 다시 저장해주세요.")
+                else:
+                    st.success("출결 정보가 성공적으로 저장되었습니다.")
+                    st.rerun()
 
 
 # 3.6. 데이터 백업
@@ -671,13 +1115,33 @@ def data_backup():
     if st.button("📤 스프레드시트로 내보내기", type="primary", disabled=not spreadsheet_id):
         with st.spinner("데이터를 내보내는 중입니다. 잠시만 기다려주세요..."):
             try:
-                spreadsheet = gc.open_by_key(spreadsheet_id)
+                spreadsheet = get_gspread_client().open_by_key(spreadsheet_id)
 
                 collections_to_backup = ["courses", "classes", "attendance"]
 
+                # 수업/학생 목록은 여러 시트에 쓰이므로 한 번만 조회
+                # (하위 컬렉션은 수업별로 반복 조회하지 않고 컬렉션 그룹 쿼리로 조회)
+                all_classes = list(db.collection("classes").stream())
+                all_student_docs = list(
+                    db.collection_group("students").stream())
+                student_info = {doc.id: doc.to_dict() for doc in
+                                all_student_docs}
+
                 for collection_name in collections_to_backup:
-                    docs = db.collection(collection_name).stream()
+                    if collection_name == "classes":
+                        docs = all_classes
+                    else:
+                        docs = db.collection(collection_name).stream()
                     data = [doc.to_dict() for doc in docs]
+                    if collection_name == "attendance":
+                        # 출결 문서의 학번/이름은 저장 당시 값이므로 현재 학생 정보로 덮어씀
+                        # (삭제된 학생은 저장된 값을 그대로 내보냄)
+                        for item in data:
+                            student = student_info.get(item.get("student_id"))
+                            if student:
+                                item["student_number"] = student.get(
+                                    "student_number")
+                                item["student_name"] = student.get("name")
                     if not data:
                         st.info(f"'{collection_name}' 컬렉션에 데이터가 없어 건너뜁니다.")
                         continue
@@ -697,19 +1161,18 @@ def data_backup():
                     set_with_dataframe(worksheet, df)
                     st.write(f"✅ '{collection_name}' 컬렉션 백업 완료.")
 
-                all_classes = list(db.collection("classes").stream())
+                class_names = {class_doc.id: class_doc.to_dict().get(
+                    'class_name') for class_doc in all_classes}
 
                 all_students = []
-                for class_doc in all_classes:
-                    class_data = class_doc.to_dict()
-                    students = db.collection("classes").document(
-                        class_doc.id).collection("students").stream()
-                    for student in students:
-                        student_data = student.to_dict()
-                        student_data['class_id'] = class_doc.id
-                        student_data['class_name'] = class_data.get(
-                            'class_name')
-                        all_students.append(student_data)
+                for student in all_student_docs:
+                    class_id = student.reference.parent.parent.id
+                    if class_id not in class_names:
+                        continue
+                    student_data = student.to_dict()
+                    student_data['class_id'] = class_id
+                    student_data['class_name'] = class_names[class_id]
+                    all_students.append(student_data)
 
                 if all_students:
                     df_students = pd.DataFrame(all_students)
@@ -729,15 +1192,14 @@ def data_backup():
                     st.info("'students' 컬렉션에 데이터가 없어 건너뜁니다.")
 
                 all_progress = []
-                for class_doc in all_classes:
-                    class_data = class_doc.to_dict()
-                    progress_items = db.collection("classes").document(
-                        class_doc.id).collection("progress").stream()
-                    for item in progress_items:
-                        item_data = item.to_dict()
-                        item_data['class_id'] = class_doc.id
-                        item_data['class_name'] = class_data.get('class_name')
-                        all_progress.append(item_data)
+                for item in db.collection_group("progress").stream():
+                    class_id = item.reference.parent.parent.id
+                    if class_id not in class_names:
+                        continue
+                    item_data = item.to_dict()
+                    item_data['class_id'] = class_id
+                    item_data['class_name'] = class_names[class_id]
+                    all_progress.append(item_data)
 
                 if all_progress:
                     df_progress = pd.DataFrame(all_progress)
@@ -777,6 +1239,14 @@ def main():
         menu_options = ["교과 관리", "수업 관리", "학생 관리", "진도 관리", "출결 관리", "데이터 백업"]
         selected_menu = st.selectbox("이동할 메뉴를 선택하세요", menu_options)
 
+        st.divider()
+        # 다른 기기/사용자가 변경한 내용을 바로 반영하고 싶을 때 캐시를 비움
+        if st.button("🔄 새로고침", use_container_width=True):
+            load_courses.clear()
+            load_classes.clear()
+            clear_student_cache()
+            _course_snapshot.clear()
+
     if selected_menu == "교과 관리":
         course_management()
     elif selected_menu == "수업 관리":